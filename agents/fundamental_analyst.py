@@ -1,6 +1,40 @@
-import openai
-from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_CHAT_MODEL
+import asyncio
+import time
+import tiktoken
+from config import OPENAI_CHAT_MODEL
 from rag.retriever import RAGRetriever
+from utils import get_shared_async_client
+
+# TTLs for cached retrievals. News goes stale quickly; the business summary
+# only changes when the index is re-scraped, so it can live much longer.
+NEWS_CACHE_TTL_SECONDS = 10 * 60
+SUMMARY_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Retrieved context is concatenated raw into the prompt, and input tokens
+# dominate latency/cost for a short max_tokens=600 reply. Cap the context.
+MAX_CONTEXT_TOKENS = 1500
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+
+
+def _dedupe_documents(context: str) -> str:
+    """Drops exact-duplicate retrieved documents (e.g. repeated headlines)."""
+    seen = set()
+    unique_docs = []
+    for doc in context.split("\n---\n"):
+        key = doc.strip()
+        if key and key not in seen:
+            seen.add(key)
+            unique_docs.append(doc)
+    return "\n---\n".join(unique_docs)
+
+
+def _trim_to_token_budget(text: str, budget: int = MAX_CONTEXT_TOKENS) -> str:
+    """Truncates text to at most `budget` tokens of the chat model's encoding."""
+    tokens = _encoding.encode(text)
+    if len(tokens) <= budget:
+        return text
+    return _encoding.decode(tokens[:budget])
 
 class FundamentalAnalystAgent:
     """
@@ -11,41 +45,86 @@ class FundamentalAnalystAgent:
 
     def __init__(self, retriever: RAGRetriever):
         self.retriever = retriever
-        self.client = openai.AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=OPENAI_API_VERSION,
-        )
+        # --- ASYNC: shared async client (one connection pool for all
+        # agents) so analyze() can run concurrently with the other agents.
+        self.client = get_shared_async_client()
+        # --- CACHE ---
+        # Re-analyzing the same ticker re-embeds and re-searches identical
+        # queries. Cache retrievals keyed on (ticker, query, k) with a TTL
+        # so repeated reports skip the embedding + FAISS round-trip.
+        self._retrieve_cache = {}
 
-    def analyze(self, ticker: str):
+    def _cached_retrieve_batch(self, ticker: str, queries: list, ks: list, ttls: list):
+        """
+        Retrieves context for several queries with an exact-match TTL cache.
+        The agent only ever issues two fixed query templates per ticker,
+        so exact matching catches every repeat. Cache misses are batched
+        into a single retrieve_batch call (one embedding round-trip).
+        """
+        now = time.time()
+        contexts = [None] * len(queries)
+        miss_indices = []
+
+        for i, (query, k, ttl) in enumerate(zip(queries, ks, ttls)):
+            cached = self._retrieve_cache.get((ticker, query, k))
+            if cached is not None and now - cached[1] < ttl:
+                contexts[i] = cached[0]
+            else:
+                miss_indices.append(i)
+
+        if miss_indices:
+            fresh = self.retriever.retrieve_batch(
+                ticker,
+                [queries[i] for i in miss_indices],
+                [ks[i] for i in miss_indices]
+            )
+            for i, result in zip(miss_indices, fresh):
+                contexts[i] = result
+                # Failures come back as None and are NOT cached: a
+                # transient embedding error or a not-yet-ingested index
+                # must not poison the slot for the whole TTL.
+                if result is not None:
+                    self._retrieve_cache[(ticker, queries[i], ks[i])] = (result, time.time())
+
+        return contexts
+
+    async def analyze(self, ticker: str):
         """
         Performs fundamental analysis and generates a summary.
         """
         print("Fundamental Analyst: Analyzing...")
         ticker = ticker.upper() # Ensure ticker is uppercase
-        
+
         # --- FIX: Pass the Ticker explicitly to the retrieve method ---
-        
-        # 1. Query for the company summary
+
+        # 1 + 2. Query for the company summary and recent news.
+        # Both queries are batched into ONE embedding API call, and the
+        # retriever does blocking embedding + FAISS I/O, so run it in a
+        # worker thread to keep the event loop free.
         summary_query = f"Company business summary and financial health for {ticker}"
-        # Pass 'ticker' as the first argument
-        summary_context = self.retriever.retrieve(ticker, summary_query, k=1) 
-        
-        # 2. Query for recent news
         news_query = f"Recent news headlines for {ticker}"
-        # Pass 'ticker' as the first argument
-        news_context = self.retriever.retrieve(ticker, news_query, k=4)
+        summary_context, news_context = await asyncio.to_thread(
+            self._cached_retrieve_batch,
+            ticker,
+            [summary_query, news_query],
+            [1, 4],
+            [SUMMARY_CACHE_TTL_SECONDS, NEWS_CACHE_TTL_SECONDS]
+        )
         
-        # 3. Combine the context
+        # Retrieval failures come back as None rather than sentinel text;
+        # bail out before building a prompt around nothing.
+        if summary_context is None and news_context is None:
+            return f"Fundamental Analyst: Could not retrieve relevant context for {ticker}. The index may be empty."
+
+        # 3. Combine the context, dropping duplicate headlines and trimming
+        # to the token budget so prompt cost stays bounded.
         combined_context = (
             "--- Company Summary Context ---\n"
-            f"{summary_context}\n\n"
+            f"{summary_context or 'No company summary was retrieved.'}\n\n"
             "--- Recent News Context ---\n"
-            f"{news_context}"
+            f"{_dedupe_documents(news_context) if news_context else 'No recent news was retrieved.'}"
         )
-
-        if "No context found" in summary_context and "No context found" in news_context:
-            return f"Fundamental Analyst: Could not retrieve relevant context for {ticker}. The index may be empty."
+        combined_context = _trim_to_token_budget(combined_context)
 
         # The prompt remains the same, as it was already fixed.
         prompt = f"""
@@ -66,7 +145,7 @@ class FundamentalAnalystAgent:
         """
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=OPENAI_CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3, 
@@ -1,6 +1,14 @@
-import openai
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
-from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_CHAT_MODEL
+from config import OPENAI_CHAT_MODEL
+from utils import get_shared_async_client, get_yf_session
+
+# TTLs for cached macro data. Indicator prices move at most once per trading
+# minute; headlines churn far slower than that.
+PRICE_CACHE_TTL_SECONDS = 60
+NEWS_CACHE_TTL_SECONDS = 15 * 60
 
 class MacroeconomicAgent:
     """
@@ -9,58 +17,97 @@ class MacroeconomicAgent:
     before prompting the LLM.
     """
     def __init__(self):
-        self.client = openai.AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=OPENAI_API_VERSION,
-        )
+        # --- ASYNC: shared async client (one connection pool for all
+        # agents) so analyze() can run concurrently with the other agents.
+        self.client = get_shared_async_client()
         # Define key macroeconomic indicators
         self.macro_tickers = {
             "S&P 500": "^GSPC",
             "10-Yr Treasury": "^TNX",
             "Crude Oil": "CL=F"
         }
+        # --- CACHE ---
+        # The macro indicators are the same for every analyze() call, so
+        # cache the batched price frame and the news lookups with TTLs.
+        # On a hit the agent skips all yfinance HTTP entirely.
+        self._price_cache = None   # (hist_all, fetched_at)
+        self._news_cache = None    # (news_by_ticker, fetched_at)
+
+    def _fetch_news(self, ticker_str):
+        """Fetches the top 2 news items for a single indicator ticker."""
+        try:
+            return yf.Ticker(ticker_str, session=get_yf_session()).news[:2]
+        except Exception as e:
+            print(f"Macroeconomic Agent: Could not fetch news for {ticker_str} - {e}")
+            return []
 
     def _get_macro_context(self):
         """
         Fetches live data and recent news for key macro indicators.
+
+        Price history for all indicators comes from a single batched
+        yf.download call, and the per-ticker news lookups run concurrently,
+        instead of 3 sequential Ticker.info/.history/.news round-trips.
         """
         print("Macroeconomic Agent: Fetching live macro context...")
         context_string = "--- Real-Time Macroeconomic Context ---\n"
-        
+
+        ticker_strs = list(self.macro_tickers.values())
+        now = time.time()
+
+        # 1. One batched request for all indicators' last 5 days of prices
+        # (cached for a minute -- they change at most once per trading minute).
+        if self._price_cache is not None and now - self._price_cache[1] < PRICE_CACHE_TTL_SECONDS:
+            hist_all = self._price_cache[0]
+        else:
+            hist_all = yf.download(
+                ticker_strs, period="5d", group_by="ticker", threads=True,
+                progress=False, session=get_yf_session()
+            )
+            self._price_cache = (hist_all, now)
+
+        # 2. Fetch news for all indicators concurrently while we format prices
+        # (cached for 15 minutes -- headlines churn slowly).
+        if self._news_cache is not None and now - self._news_cache[1] < NEWS_CACHE_TTL_SECONDS:
+            news_by_ticker = self._news_cache[0]
+        else:
+            with ThreadPoolExecutor(max_workers=len(ticker_strs)) as pool:
+                news_by_ticker = dict(zip(ticker_strs, pool.map(self._fetch_news, ticker_strs)))
+            self._news_cache = (news_by_ticker, now)
+
         for name, ticker_str in self.macro_tickers.items():
-            ticker = yf.Ticker(ticker_str)
-            info = ticker.info
-            hist = ticker.history(period="5d") # Get last 5 days
-            
+            # Slice this indicator out of the multi-index download frame.
+            hist = hist_all[ticker_str] if len(ticker_strs) > 1 else hist_all
+            closes = hist['Close'].dropna()
+
             # Get latest price and previous close
-            latest_price = hist['Close'].iloc[-1]
-            prev_close = hist['Close'].iloc[-2]
+            latest_price = closes.iloc[-1]
+            prev_close = closes.iloc[-2]
             change = latest_price - prev_close
             change_percent = (change / prev_close) * 100
 
             context_string += f"\nIndicator: {name} ({ticker_str})\n"
             context_string += f"  Latest Value: {latest_price:.2f}\n"
             context_string += f"  Change: {change:+.2f} ({change_percent:+.2f}%)\n"
-            
-            # Get latest news
-            news = ticker.news[:2] # Get top 2 news items
+
+            news = news_by_ticker.get(ticker_str, [])
             if news:
                 context_string += "  Recent News:\n"
                 for item in news:
                     context_string += f"    - {item.get('headline', 'No Headline')}\n"
-        
+
         context_string += "--- End of Context ---\n"
         return context_string
 
-    def analyze(self, ticker: str, company_info: str):
+    async def analyze(self, ticker: str, company_info: str):
         """
         Analyzes and summarizes market trends using grounded, real-time data.
         """
         print("Macroeconomic Agent: Analyzing...")
-        
+
         # 1. Get the live macro context
-        context_string = self._get_macro_context()
+        # yfinance is blocking HTTP, so run it in a worker thread.
+        context_string = await asyncio.to_thread(self._get_macro_context)
 
         # 2. Create the grounded prompt
         prompt = f"""
@@ -84,7 +131,7 @@ class MacroeconomicAgent:
         Provide a concise analysis.
         """
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=OPENAI_CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.5, # Lower temperature for more factual response
@@ -1,11 +1,100 @@
+import asyncio
+import functools
 import os
+import time
 import yfinance as yf
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Headless server: skip GUI backend autodetection
 import mplfinance as mpf  # For plotting financial charts
-import openai
-import random # Added for simple forecast modeling
-from datetime import timedelta # Added for date manipulation
-from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_CHAT_MODEL
+from config import OPENAI_CHAT_MODEL
+from utils import get_shared_async_client, get_yf_session
+
+
+try:
+    # Optional JIT: if numba is installed the indicator kernels below get
+    # compiled to machine code; without it they run as plain NumPy/Python,
+    # which is already fast enough for ~252-bar arrays.
+    from numba import njit
+except ImportError:
+    def njit(**_kwargs):
+        def _decorate(func):
+            return func
+        return _decorate
+
+
+# Module-level RNG for the forecast walk. SFC64 is ~2x faster than the
+# default PCG64 bit generator, and a single shared instance avoids
+# re-seeding a fresh generator on every call.
+_rng = np.random.default_rng(np.random.SFC64())
+
+
+# History cache TTL: fresh enough for intraday bars, long enough that a
+# report's analyze() + get_chart_data() pair always shares one download.
+HISTORY_TTL_SECONDS = 300
+
+
+@functools.lru_cache(maxsize=256)
+def _history_cached(ticker: str, period: str, bucket: int) -> pd.DataFrame:
+    """
+    Fetches OHLCV history, memoized per (ticker, period, TTL bucket).
+
+    analyze() and get_chart_data() both need the same frame, so without
+    this the same data was fetched twice per request. Callers must copy
+    the result before mutating it (e.g. adding indicator columns).
+    """
+    return yf.Ticker(ticker, session=get_yf_session()).history(period=period)
+
+
+def _history(ticker: str, period: str = "1y") -> pd.DataFrame:
+    """Cached history fetch with a 5-minute TTL (time-bucketed lru_cache key)."""
+    return _history_cached(ticker, period, int(time.time() // HISTORY_TTL_SECONDS))
+
+
+@njit(cache=True)
+def _rsi_wilder(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Computes the RSI with Wilder's smoothing in one fully fused pass: the
+    delta, gain/loss split, both EMAs, and the final RSI expression all
+    live inside a single loop, so the only arrays touched are one read of
+    `close` and one write of the output (versus ~8 transient Series in the
+    original pandas chain). Matches ewm(com=period-1, adjust=False) output;
+    the scalar max(avg_loss, 1e-9) guard replaces the full-Series
+    .replace(0, 1e-9) copy the pandas version paid for the safe divide.
+    """
+    n = close.shape[0]
+    rsi = np.empty(n, dtype=np.float64)
+    # The first delta is undefined; pandas' where(...) treated it as 0.
+    avg_gain = 0.0
+    avg_loss = 0.0
+    rsi[0] = 0.0
+    for i in range(1, n):
+        delta = float(close[i]) - float(close[i - 1])
+        gain = delta if delta > 0.0 else 0.0
+        loss = -delta if delta < 0.0 else 0.0
+        # Wilder EMA accumulator: avg += (x - avg) / period
+        avg_gain += (gain - avg_gain) / period
+        avg_loss += (loss - avg_loss) / period
+        rs = avg_gain / max(avg_loss, 1e-9)
+        rsi[i] = 100.0 - (100.0 / (1.0 + rs))
+    return rsi
+
+
+def _sma(close: np.ndarray, window: int) -> np.ndarray:
+    """
+    Simple moving average via a running cumulative sum: each window mean is
+    the difference of two prefix sums, making this true O(n) versus the
+    O(n*window) convolution it replaces. NaN-padded to match pandas'
+    rolling(window).mean() alignment. The float64 accumulator keeps the
+    prefix-sum subtraction accurate for float32 inputs.
+    """
+    n = close.shape[0]
+    if n < window:
+        return np.full(n, np.nan)
+    prefix = np.cumsum(close, dtype=np.float64)
+    valid = (prefix[window - 1:] - np.concatenate(([0.0], prefix[:-window]))) / window
+    return np.concatenate([np.full(window - 1, np.nan), valid])
 
 class TechnicalAnalystAgent:
     """
@@ -27,78 +116,130 @@ class TechnicalAnalystAgent:
         self.chart_output_dir = chart_output_dir
         os.makedirs(self.chart_output_dir, exist_ok=True)
         
-        # Initialize the Azure OpenAI client for generating analysis
-        self.client = openai.AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=OPENAI_API_VERSION,
-        )
+        # Shared async Azure OpenAI client (one connection pool for all
+        # agents) so analyze() can overlap with the other agents.
+        self.client = get_shared_async_client()
+
+        # Per-(ticker, day) cache of computed features so analyze() and
+        # get_chart_data() share one fetch + indicator + forecast pass.
+        # Bounded so a fleet of tickers refreshed over many days cannot
+        # grow it without limit; oldest entries are evicted first.
+        self._feature_cache = {}
+        self._feature_cache_max = 256
+
+    # --- SHARED FEATURE PIPELINE ---
+
+    def _compute_features(self, ticker: str):
+        """
+        Fetches history, computes SMA/RSI indicators, and builds the 30-day
+        forecast chart data in ONE pass, cached per (ticker, calendar day).
+        Both analyze() and get_chart_data() consume this, so neither method
+        re-fetches data or re-runs the indicator pipeline.
+
+        Returns:
+            dict: {'hist': DataFrame (with SMA_50/SMA_200/RSI columns),
+                   'chart_data': list of per-day chart records}
+        """
+        bucket = int(time.time() // HISTORY_TTL_SECONDS)
+        features = self._feature_cache.get((ticker, bucket))
+        if features is not None:
+            return features
+
+        # 1. Fetch 1 year of historical data (cached with a 5-minute TTL)
+        hist = _history(ticker)
+
+        if hist.empty:
+            raise ValueError(f"No historical data found for {ticker}.")
+
+        # Keep only the OHLCV columns the pipeline actually uses (dropping
+        # Dividends/Stock Splits) and downcast to float32: halves the
+        # bandwidth of the indicator math and chart render, and chart/LLM
+        # output is formatted to 2 decimals anyway. astype() copies, so the
+        # cached frame from _history_1y stays pristine.
+        hist = hist[['Open', 'High', 'Low', 'Close', 'Volume']].astype('float32')
+
+        # 2. Calculate Technical Indicators (SMA 50/200, RSI)
+        # Computed on a raw NumPy view in single-pass kernels instead of
+        # chained pandas ops (see _sma / _rsi_wilder above).
+        close = hist['Close'].to_numpy()
+        hist['SMA_50'] = _sma(close, 50)
+        hist['SMA_200'] = _sma(close, 200)
+        hist['RSI'] = _rsi_wilder(close)
+
+        # 3. Generate a simple 30-day conceptual forecast
+        last_price = hist['Close'].iloc[-1]
+        last_date = hist.index[-1]
+
+        # Calculate a simple daily drift (avg daily change over last quarter)
+        # on a raw NumPy slice: one ratio pass over the last ~60 returns
+        # instead of a full-length pct_change Series plus a tail copy.
+        # ddof=1 matches pandas' std default.
+        closes_tail = close[-61:].astype(np.float64)
+        returns_tail = closes_tail[1:] / closes_tail[:-1] - 1.0
+        avg_daily_drift = returns_tail.mean()
+        std_dev = returns_tail.std(ddof=1) # Volatility
+
+        # Vectorized GBM-style walk: draw all 30 shocks at once and
+        # compound them with a cumulative product (same math as the old
+        # per-day random.gauss loop, without the interpreter overhead).
+        shocks = _rng.normal(avg_daily_drift, std_dev, 30)
+        forecast_prices = last_price * np.cumprod(1 + shocks)
+
+        # Real business days in one vectorized call: the old
+        # last_date + timedelta(days=i) loop emitted weekends, which do not
+        # exist in trading data.
+        forecast_dates = pd.bdate_range(
+            last_date + pd.tseries.offsets.BDay(), periods=30
+        ).strftime('%Y-%m-%d')
+
+        # 4. Assemble the chart payload as a dict of columns instead of one
+        # dict per row: ~280 rows x 3 keys of small-dict allocations become
+        # two array concatenations, and orjson serializes the NumPy columns
+        # directly (NaN gaps become JSON nulls, as the per-row None did).
+        chart_data = {
+            "date": hist.index.strftime('%Y-%m-%d').tolist() + forecast_dates.tolist(),
+            "price_actual": np.concatenate([close.astype(np.float64), np.full(30, np.nan)]),
+            "price_forecast": np.concatenate([np.full(close.shape[0], np.nan), forecast_prices]),
+        }
+
+        features = {
+            "hist": hist,
+            "chart_data": chart_data,
+            # Scalars analyze() needs, so it never parses the chart payload.
+            "last_price": float(last_price),
+            "forecast_end_price": float(forecast_prices[-1]),
+        }
+        if len(self._feature_cache) >= self._feature_cache_max:
+            # dicts preserve insertion order, so the first key is the oldest.
+            self._feature_cache.pop(next(iter(self._feature_cache)))
+        self._feature_cache[(ticker, bucket)] = features
+        return features
 
     # --- METHOD FOR FORECASTING ENDPOINT ---
-    
+
     def get_chart_data(self, ticker: str):
         """
         Fetches historical data and generates a simple 30-day forecast.
         This method is designed to provide raw data for an interactive frontend chart.
-        
+
         Returns:
-            list: A list of dictionaries, each containing 'date', 'price_actual', 
-                  and 'price_forecast'.
+            dict: Columnar chart data with 'date', 'price_actual', and
+                  'price_forecast' arrays of equal length (NaN where a
+                  series has no value for that date).
         """
         print(f"Technical Analyst: Fetching chart data for {ticker}...")
         try:
-            # 1. Fetch 1 year of historical data
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period="1y")
-
-            if hist.empty:
-                raise ValueError(f"No historical data found for {ticker}.")
-
-            # 2. Format historical data
-            chart_data = []
-            for date, row in hist.iterrows():
-                chart_data.append({
-                    "date": date.strftime('%Y-%m-%d'), # Format date as string
-                    "price_actual": row['Close'],
-                    "price_forecast": None # No forecast for historical data
-                })
-
-            # 3. Generate a simple 30-day conceptual forecast
-            last_price = hist['Close'].iloc[-1]
-            last_date = hist.index[-1]
-            
-            # Calculate a simple daily drift (avg daily change over last quarter)
-            daily_returns = hist['Close'].pct_change().tail(60) # Last 60 trading days
-            avg_daily_drift = daily_returns.mean()
-            std_dev = daily_returns.std() # Volatility
-
-            forecast_price = last_price
-            for i in range(1, 31): # Forecast for 30 days
-                # Create a random shock based on volatility, add the drift
-                daily_shock = random.gauss(avg_daily_drift, std_dev)
-                forecast_price *= (1 + daily_shock)
-                
-                # Get the next business day (approximate)
-                next_date = last_date + timedelta(days=i)
-                
-                chart_data.append({
-                    "date": next_date.strftime('%Y-%m-%d'),
-                    "price_actual": None, # No actual price for future dates
-                    "price_forecast": forecast_price
-                })
-                
-            return chart_data
-
+            return self._compute_features(ticker)["chart_data"]
         except Exception as e:
             print(f"Technical Analyst: Error getting chart data for {ticker} - {e}")
             raise e # Re-raise exception to be caught by FastAPI
 
     # --- EXISTING METHOD FOR REPORT GENERATION ---
 
-    def analyze(self, ticker: str):
+    async def analyze(self, ticker: str):
         """
         Performs technical analysis for the given ticker, including forecast interpretation.
-        
+
         Returns:
             tuple: (report_string, chart_file_path)
         """
@@ -106,40 +247,19 @@ class TechnicalAnalystAgent:
         chart_path = None
 
         try:
-            # 1. Fetch historical data & calculate indicators
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period="1y")
-
-            if hist.empty:
-                return f"Technical Analyst: No historical data found for {ticker}.", None
-
-            # Calculate Technical Indicators (SMA 50/200, RSI)
-            hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
-            hist['SMA_200'] = hist['Close'].rolling(window=200).mean()
-            delta = hist['Close'].diff(1)
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.ewm(com=13, adjust=False).mean()
-            avg_loss = loss.ewm(com=13, adjust=False).mean()
-            rs = avg_gain / avg_loss.replace(0, 1e-9)
-            hist['RSI'] = 100 - (100 / (1 + rs))
+            # 1. Fetch history, indicators, and forecast in one shared pass
+            # (cached per ticker per day, see _compute_features). yfinance is
+            # blocking HTTP, so keep it in a worker thread.
+            features = await asyncio.to_thread(self._compute_features, ticker)
+            hist = features["hist"]
 
             # 2. INTERPRET FORECAST DIRECTION (NEW LOGIC)
-            
-            # Use the chart data method to get forecast details
-            forecast_data = self.get_chart_data(ticker) 
-            
-            # Get start/end points of the forecast series
-            if forecast_data:
-                # Find the latest actual price (end of historical data)
-                actual_end_price = next(d['price_actual'] for d in reversed(forecast_data) if d['price_actual'] is not None)
-                
-                # Find the final predicted price (last point in the list)
-                predicted_end_price = forecast_data[-1]['price_forecast']
-            else:
-                actual_end_price = hist['Close'].iloc[-1]
-                predicted_end_price = actual_end_price # Default to flat if forecast failed
-            
+
+            # Start/end points of the forecast come straight from the shared
+            # feature pass -- no scanning of the chart payload needed.
+            actual_end_price = features["last_price"]
+            predicted_end_price = features["forecast_end_price"]
+
             # Calculate 30-day percentage change
             forecast_change = ((predicted_end_price - actual_end_price) / actual_end_price) * 100
 
@@ -150,29 +270,44 @@ class TechnicalAnalystAgent:
             else:
                 forecast_direction = "Neutral (Flat Trend)"
 
-            # 3. Generate and Save Chart (UNCHANGED)
-            chart_path = os.path.join(self.chart_output_dir, f"{ticker}_technical_chart.png")
+            # 3. Generate and Save Chart
+            # The filename carries the last trading day, so a chart rendered
+            # earlier the same market day (identical data) is reused and the
+            # whole matplotlib pipeline is skipped.
+            last_bar_day = hist.index[-1].date().isoformat()
+            chart_path = os.path.join(
+                self.chart_output_dir, f"{ticker}_technical_chart_{last_bar_day}.png")
 
-            ap = [
-                mpf.make_addplot(hist['SMA_50'], color='blue', width=0.7),
-                mpf.make_addplot(hist['SMA_200'], color='red', width=0.7),
-                mpf.make_addplot(hist['RSI'], panel=2, color='purple', ylabel='RSI', ylim=(0,100))
-            ]
+            chart_task = None
+            if os.path.exists(chart_path):
+                print(f"Chart for {ticker} ({last_bar_day}) already rendered; reusing it.")
+            else:
+                ap = [
+                    mpf.make_addplot(hist['SMA_50'], color='blue', width=0.7),
+                    mpf.make_addplot(hist['SMA_200'], color='red', width=0.7),
+                    mpf.make_addplot(hist['RSI'], panel=2, color='purple', ylabel='RSI', ylim=(0,100))
+                ]
+
+                # Chart rendering is CPU + file I/O (~300-800 ms of matplotlib
+                # Agg work); kick it off in a worker thread and only await it
+                # after the LLM call below, so the render overlaps the 1-2 s of
+                # OpenAI latency instead of blocking the request path.
+                chart_task = asyncio.create_task(asyncio.to_thread(
+                    mpf.plot,
+                    hist, type='candle', style='yahoo', title=f"{ticker} 1-Year Technical Analysis",
+                    ylabel='Price ($)', volume=True, ylabel_lower='Volume', addplot=ap,
+                    savefig=chart_path, panel_ratios=(4, 1, 1)
+                ))
 
-            mpf.plot(
-                hist, type='candle', style='yahoo', title=f"{ticker} 1-Year Technical Analysis",
-                ylabel='Price ($)', volume=True, ylabel_lower='Volume', addplot=ap,
-                savefig=chart_path, panel_ratios=(4, 1, 1)
-            )
-            print(f"Chart saved to {chart_path}")
-            
             # 4. Use OpenAI to Generate a Summary (PROMPT UPDATED)
-            
-            latest_data = hist.iloc[-1]
-            latest_price = latest_data['Close']
-            latest_sma_50 = latest_data['SMA_50']
-            latest_sma_200 = latest_data['SMA_200']
-            latest_rsi = latest_data['RSI']
+
+            # Materialize the last row once as plain Python floats instead
+            # of going through pandas label-indexing four separate times.
+            last_row = hist.iloc[-1].to_dict()
+            latest_price = float(last_row['Close'])
+            latest_sma_50 = float(last_row['SMA_50'])
+            latest_sma_200 = float(last_row['SMA_200'])
+            latest_rsi = float(last_row['RSI'])
 
             prompt = f"""
             As a technical financial analyst, provide a brief, synthesized summary for {ticker} based on the following data points:
@@ -194,13 +329,28 @@ class TechnicalAnalystAgent:
             Provide a concise, 2-3 sentence summary of the current technical outlook.
             """
 
-            summary_response = self.client.chat.completions.create(
+            # Stream the completion and accumulate the deltas: tokens arrive
+            # while the chart render above is still running, so the two
+            # finish together instead of back-to-back. (The report/PDF
+            # pipeline needs the full text, so the stream is consumed here
+            # rather than surfaced to the caller.)
+            summary_stream = await self.client.chat.completions.create(
                 model=OPENAI_CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.5,
-                max_tokens=300
+                max_tokens=300,
+                stream=True
             )
-            ai_summary = summary_response.choices[0].message.content
+            summary_parts = []
+            async for chunk in summary_stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    summary_parts.append(chunk.choices[0].delta.content)
+            ai_summary = "".join(summary_parts)
+
+            # The chart must exist before we return its path.
+            if chart_task is not None:
+                await chart_task
+                print(f"Chart saved to {chart_path}")
 
             # 5. Formulate the final report
             report = f"""
@@ -1,9 +1,13 @@
+import asyncio
 import os
 import datetime
+import uuid
 from contextlib import asynccontextmanager
+import yfinance as yf
 from fastapi import FastAPI, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
 # Import FileResponse to send files (like PDFs) directly
-from fastapi.responses import JSONResponse, FileResponse 
+from fastapi.responses import FileResponse, ORJSONResponse
 
 # Project Modules
 from data_scraper_agent.scraper import DataScraperAgent
@@ -14,10 +18,43 @@ from agents.technical_analyst import TechnicalAnalystAgent
 from agents.macroeconomic_agent import MacroeconomicAgent
 from cio_agent.cio import CIOAgent
 from config import DEFAULT_TICKER
+from utils import get_yf_session
 
 # Global storage for application components
 app_state = {}
 
+def _warm_up(faiss_manager):
+    """
+    Pays one-time cold-start costs at startup instead of on the first
+    request: the Yahoo DNS + TLS handshake + cookie seed, and the FAISS
+    index load for the default ticker. Failures are non-fatal -- the first
+    real request simply pays the cost itself.
+    """
+    try:
+        yf.Ticker(DEFAULT_TICKER, session=get_yf_session()).history(period="1d")
+        print("Warm-up: yfinance session primed.")
+    except Exception as e:
+        print(f"Warm-up: yfinance priming failed ({e})")
+    try:
+        if faiss_manager.load_index(DEFAULT_TICKER):
+            print(f"Warm-up: FAISS index for {DEFAULT_TICKER} preloaded.")
+    except Exception as e:
+        print(f"Warm-up: FAISS preload failed ({e})")
+    try:
+        # A throwaway 2-bar render primes matplotlib's font and style
+        # caches (~100-300 ms cold), so the first real chart skips them.
+        import io
+        import pandas as pd
+        import mplfinance as mpf
+        dummy = pd.DataFrame(
+            {"Open": [1.0, 1.0], "High": [1.0, 1.0], "Low": [1.0, 1.0],
+             "Close": [1.0, 1.0], "Volume": [0.0, 0.0]},
+            index=pd.bdate_range("2024-01-01", periods=2))
+        mpf.plot(dummy, type='candle', style='yahoo', volume=True, savefig=io.BytesIO())
+        print("Warm-up: matplotlib render pipeline primed.")
+    except Exception as e:
+        print(f"Warm-up: chart priming failed ({e})")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -45,8 +82,14 @@ async def lifespan(app: FastAPI):
     # Store components in application state
     app_state["faiss_manager"] = faiss_manager
     app_state["cio_agent"] = cio_agent
-    app_state["technical_analyst"] = technical_analyst 
-    
+    app_state["technical_analyst"] = technical_analyst
+    # In-memory registry for long-running report jobs (see /generate-and-analyze).
+    app_state["jobs"] = {}
+
+    # Kick off warm-up in the background so startup is not delayed; keep a
+    # handle on the task so it is not garbage-collected mid-flight.
+    app_state["warmup_task"] = asyncio.create_task(asyncio.to_thread(_warm_up, faiss_manager))
+
     print("--- Initialization Complete. Server Ready ---")
     yield
     
@@ -59,8 +102,13 @@ app = FastAPI(
     title="AI Investment Analyst Backend",
     description="A multi-agent system for financial report generation.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson is ~5x faster than stdlib json on float-heavy payloads like
+    # the forecast chart data, and handles NumPy arrays natively.
+    default_response_class=ORJSONResponse
 )
+# The ~280-row forecast JSON compresses ~70% on the wire.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 @app.get("/", summary="Root Health Check")
 def read_root():
@@ -80,8 +128,13 @@ async def get_forecast_data(ticker: str):
     technical_analyst: TechnicalAnalystAgent = app_state["technical_analyst"]
 
     try:
-        chart_data = technical_analyst.get_chart_data(ticker.upper())
-        return JSONResponse(content={
+        # get_chart_data does blocking yfinance I/O; keep it off the event loop.
+        chart_data = await asyncio.to_thread(technical_analyst.get_chart_data, ticker.upper())
+        # Return ORJSONResponse directly: plain dicts go through FastAPI's
+        # jsonable_encoder first, which chokes on the NumPy arrays in the
+        # chart data. Bypassing it lets orjson serialize the arrays
+        # natively (NaN gaps become nulls) and skips the encoder pass.
+        return ORJSONResponse(content={
             "ticker": ticker.upper(),
             "timestamp": datetime.datetime.now().isoformat(),
             "chart_data": chart_data
@@ -105,13 +158,13 @@ async def analyze_ticker_and_download_pdf(ticker: str):
     faiss_manager: FAISSManager = app_state["faiss_manager"]
 
     try:
-        # 1. Check if local index exists
-        is_loaded = faiss_manager.load_index(ticker)
+        # 1. Check if local index exists (disk I/O -> worker thread)
+        is_loaded = await asyncio.to_thread(faiss_manager.load_index, ticker)
         
         if not is_loaded:
             # 2. If not local, try to download from Azure
             print(f"Local index for {ticker} not found. Attempting sync from Azure...")
-            sync_success = faiss_manager.sync_from_azure(ticker)
+            sync_success = await asyncio.to_thread(faiss_manager.sync_from_azure, ticker)
             
             if not sync_success:
                 # 3. If it's not on Azure, the data doesn't exist. Raise 404.
@@ -121,7 +174,7 @@ async def analyze_ticker_and_download_pdf(ticker: str):
                 )
         
         # 4. Run the pipeline (we are now certain the correct index is loaded)
-        pdf_filepath = cio_agent.generate_investment_report(ticker)
+        pdf_filepath = await cio_agent.generate_investment_report(ticker)
 
         if not pdf_filepath or not os.path.exists(pdf_filepath):
             raise HTTPException(status_code=500, detail="Failed to create PDF report.")
@@ -153,28 +206,75 @@ async def ingest_data(ticker: str):
     
     try:
         data_scraper = DataScraperAgent(faiss_manager)
-        data_scraper.scrape_and_process(ticker) 
-        
-        return JSONResponse(content={
+        # Scraping embeds and syncs to Azure -- all blocking I/O.
+        await asyncio.to_thread(data_scraper.scrape_and_process, ticker)
+
+        return {
             "status": "success",
             "ticker": ticker,
             "message": f"Data for {ticker} scraped, embedded, and synced to Azure Blob Storage."
-        })
+        }
     except Exception as e:
         print(f"Data ingestion failed for {ticker}: {e}")
         raise HTTPException(status_code=500, detail=f"Data ingestion failed: {e}")
 
 
+async def _run_report_job(job_id: str, ticker: str):
+    """
+    Runs the full scrape -> analyze -> PDF pipeline for a background job,
+    recording progress in app_state["jobs"][job_id].
+    """
+    jobs = app_state["jobs"]
+    faiss_manager: FAISSManager = app_state["faiss_manager"]
+    cio_agent: CIOAgent = app_state["cio_agent"]
+    try:
+        # --- STEP 1: Run Ingestion (without the Azure upload) ---
+        jobs[job_id]["phase"] = "ingestion"
+        print(f"Job {job_id}: Starting Step 1 (Ingestion) for {ticker}...")
+        data_scraper = DataScraperAgent(faiss_manager)
+        await asyncio.to_thread(data_scraper.scrape_and_process, ticker, sync_to_azure=False)
+        print(f"Job {job_id}: Step 1 complete.")
+
+        # --- STEP 2: Run Analysis, overlapped with the Azure upload ---
+        # The analysis only needs the local index; the blob upload only
+        # reads the saved index files. Run both at once.
+        print(f"Job {job_id}: Starting Step 2 (Analysis) for {ticker}...")
+        _, pdf_filepath = await asyncio.gather(
+            asyncio.to_thread(faiss_manager.sync_to_azure, ticker),
+            cio_agent.generate_investment_report(
+                ticker,
+                # Surface pipeline phases to pollers of GET /jobs/{job_id}.
+                progress_callback=lambda phase: jobs[job_id].update({"phase": phase}),
+                # Step 1 just ingested fresh data; skipping the same-day
+                # PDF reuse keeps the report from reflecting the old index.
+                force=True
+            )
+        )
+
+        if not pdf_filepath or not os.path.exists(pdf_filepath):
+            raise RuntimeError("Failed to create PDF report after ingestion.")
+
+        print(f"Job {job_id}: Step 2 complete. PDF at {pdf_filepath}")
+        jobs[job_id] = {"status": "done", "ticker": ticker, "pdf_filepath": pdf_filepath}
+    except Exception as e:
+        print(f"Job {job_id}: failed for {ticker}: {e}")
+        jobs[job_id] = {"status": "failed", "ticker": ticker, "detail": str(e)}
+
+
 # --- NEW ENDPOINT FOR FRONTEND "ONE-CLICK" BUTTON ---
-@app.post("/generate-and-analyze/{ticker}", summary="Generate New Report (Slow, All-in-One)")
+@app.post("/generate-and-analyze/{ticker}", status_code=202,
+          summary="Generate New Report (Slow, All-in-One, Background Job)")
 async def generate_new_report(ticker: str):
     """
-    (User Endpoint) This is a slow, all-in-one endpoint that:
+    (User Endpoint) Kicks off the slow, all-in-one pipeline as a background
+    job and returns immediately with a job handle:
     1.  Runs the full data ingestion (scrape, embed, save, sync).
     2.  Runs the full analysis (load index, run agents, create PDF).
-    3.  Returns the generated PDF as a download.
-    
-    WARNING: This endpoint can take 30-60+ seconds and may time out.
+    3.  The finished PDF is downloaded via GET /jobs/{job_id}.
+
+    The work takes 30-60+ seconds; holding the HTTP connection open that
+    long used to trip load-balancer timeouts, so the response is now a
+    202 + job_id the frontend polls instead.
     """
     ticker = ticker.upper()
     faiss_manager: FAISSManager = app_state.get("faiss_manager")
@@ -183,31 +283,36 @@ async def generate_new_report(ticker: str):
     if not faiss_manager or not cio_agent:
          raise HTTPException(status_code=503, detail="System components not initialized.")
 
-    try:
-        # --- STEP 1: Run Ingestion ---
-        print(f"All-in-One: Starting Step 1 (Ingestion) for {ticker}...")
-        data_scraper = DataScraperAgent(faiss_manager)
-        data_scraper.scrape_and_process(ticker) 
-        print(f"All-in-One: Step 1 complete.")
+    job_id = uuid.uuid4().hex
+    app_state["jobs"][job_id] = {"status": "running", "ticker": ticker}
+    # Keep a handle on the task so it is not garbage-collected mid-flight.
+    app_state["jobs"][job_id]["task"] = asyncio.create_task(_run_report_job(job_id, ticker))
 
-        # --- STEP 2: Run Analysis ---
-        print(f"All-in-One: Starting Step 2 (Analysis) for {ticker}...")
-        # (No need to check for index, we *know* it exists now)
-        pdf_filepath = cio_agent.generate_investment_report(ticker)
+    return {
+        "status": "accepted",
+        "ticker": ticker,
+        "job_id": job_id,
+        "message": f"Report generation started. Poll GET /jobs/{job_id} for the result."
+    }
 
-        if not pdf_filepath or not os.path.exists(pdf_filepath):
-            raise HTTPException(status_code=500, detail="Failed to create PDF report after ingestion.")
-        
-        print(f"All-in-One: Step 2 complete. Returning PDF.")
-        
-        # --- STEP 3: Return PDF File ---
-        pdf_filename = os.path.basename(pdf_filepath)
+
+@app.get("/jobs/{job_id}", summary="Poll a Background Report Job")
+async def get_job_status(job_id: str):
+    """
+    Returns the status of a background report job. While running (or after
+    a failure) this is a small JSON status payload; once the job is done it
+    returns the generated PDF directly.
+    """
+    job = app_state.get("jobs", {}).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+
+    if job["status"] == "done":
+        pdf_filepath = job["pdf_filepath"]
         return FileResponse(
             path=pdf_filepath,
             media_type='application/pdf',
-            filename=pdf_filename
+            filename=os.path.basename(pdf_filepath)
         )
 
-    except Exception as e:
-        print(f"All-in-One analysis failed for {ticker}: {e}")
-        raise HTTPException(status_code=500, detail=f"Full report generation failed: {e}")
\ No newline at end of file
+    return {k: v for k, v in job.items() if k != "task"}
\ No newline at end of file
@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 from config import DEFAULT_TICKER
 from data_scraper_agent.scraper import DataScraperAgent
 from vector_db.faiss_manager import FAISSManager
@@ -49,8 +50,8 @@ def main():
         macroeconomic_agent=macroeconomic_agent
     )
 
-    # Generate the final report
-    cio.generate_investment_report(args.ticker)
+    # Generate the final report (the agents are async coroutines now)
+    asyncio.run(cio.generate_investment_report(args.ticker))
 
 
 if __name__ == "__main__":
@@ -1,11 +1,38 @@
-import openai
+import asyncio
+import glob
+import hashlib
+import json
 import os
+import threading
+import time
 import datetime
 from fpdf import FPDF
 from agents.fundamental_analyst import FundamentalAnalystAgent
 from agents.technical_analyst import TechnicalAnalystAgent
 from agents.macroeconomic_agent import MacroeconomicAgent
-from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_CHAT_MODEL
+from config import OPENAI_CHAT_MODEL
+from utils import get_shared_async_client
+
+# On-disk cache for synthesis completions. Markets move, so entries go
+# stale after a few hours; within that window identical specialist reports
+# produce an identical recommendation without another LLM round-trip.
+SYNTHESIS_CACHE_DIR = os.path.join(".cache", "synthesis")
+SYNTHESIS_CACHE_TTL_SECONDS = 6 * 60 * 60
+
+# Static synthesis instructions, kept byte-identical across calls as the
+# leading system message so server-side prompt caching can reuse the
+# prefill; only the user message (the three reports) varies per call.
+SYNTHESIS_SYSTEM_PROMPT = """\
+As a Chief Investment Officer (CIO), your job is to synthesize the three specialist reports
+provided by the user into a single, cohesive investment recommendation for a client.
+
+Do not just list the findings. Explain *how* these factors interact.
+- Does the technical analysis confirm the fundamental strength?
+- Does the macroeconomic environment support or contradict the company-specific trends?
+- What is the overall, synthesized outlook?
+
+Respond with the CIO's final synthesized recommendation: a 2-3 paragraph summary
+and a clear 'BUY', 'HOLD', or 'SELL' rating."""
 
 class PDF(FPDF):
     """
@@ -21,6 +48,21 @@ class PDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
+def _warm_up_fpdf():
+    """
+    Builds a throwaway page touching every font variant the report uses,
+    so the metric tables are parsed once at startup instead of adding a
+    cold-start tail to the first _create_pdf_report call.
+    """
+    try:
+        pdf = PDF()
+        pdf.add_page()
+        for style, size in (('B', 24), ('B', 20), ('B', 16), ('B', 12), ('I', 8), ('', 12)):
+            pdf.set_font('Arial', style, size)
+            pdf.cell(0, 5, 'warm-up')
+    except Exception as e:
+        print(f"CIO Agent: FPDF warm-up failed ({e})")
+
 class CIOAgent:
     """
     Chief Investment Officer (CIO) Agent to orchestrate the workflow,
@@ -36,61 +78,89 @@ class CIOAgent:
         self.technical_analyst = technical_analyst
         self.macroeconomic_agent = macroeconomic_agent
         
-        # Initialize its own client for the final synthesis
-        self.client = openai.AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=OPENAI_API_VERSION,
-        )
+        # Shared async client for the final synthesis -- same connection
+        # pool the specialist agents use, so the synthesis call rides a
+        # warm connection instead of paying its own TCP+TLS handshake.
+        self.client = get_shared_async_client()
         
         # --- NEW ---
         # Define a directory to save the final PDF reports
         self.report_output_dir = "reports"
         os.makedirs(self.report_output_dir, exist_ok=True)
+        os.makedirs(SYNTHESIS_CACHE_DIR, exist_ok=True)
+
+        # Prime FPDF's font metric tables off the construction path.
+        threading.Thread(target=_warm_up_fpdf, daemon=True).start()
 
-    def _synthesize_report(self, fundamental_report, technical_report, macroeconomic_report):
+    async def _synthesize_report(self, fundamental_report, technical_report, macroeconomic_report):
         """
         Uses an LLM to perform a high-level synthesis of the three specialist reports.
+
+        Completions are cached on disk, keyed by the exact specialist
+        reports (plus model and temperature): when the same ticker is
+        re-analyzed within the TTL and the upstream reports come out of
+        their own caches unchanged, the synthesis is a file read instead
+        of a multi-second gpt-4 round-trip.
         """
         print("CIO Agent: Synthesizing final recommendation...")
-        
-        prompt = f"""
-        As a Chief Investment Officer (CIO), your job is to synthesize the following three specialist reports 
-        into a single, cohesive investment recommendation for a client. 
-
-        Do not just list the findings. Explain *how* these factors interact. 
-        - Does the technical analysis confirm the fundamental strength?
-        - Does the macroeconomic environment support or contradict the company-specific trends?
-        - What is the overall, synthesized outlook?
-
-        ---
-        Report 1: Fundamental Analysis
-        ---
-        {fundamental_report}
-        
-        ---
-        Report 2: Technical Analysis
-        ---
-        {technical_report}
-
-        ---
-        Report 3: Macroeconomic Outlook
-        ---
-        {macroeconomic_report}
-
-        ---
-        CIO's Final Synthesized Recommendation:
-        (Provide a 2-3 paragraph summary and a clear 'BUY', 'HOLD', or 'SELL' rating.)
-        """
-        
+
+        cache_key = hashlib.md5(
+            "\x00".join([fundamental_report, technical_report, macroeconomic_report,
+                         OPENAI_CHAT_MODEL, "0.6"]).encode("utf-8")
+        ).hexdigest()
+        cache_path = os.path.join(SYNTHESIS_CACHE_DIR, f"{cache_key}.json")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if time.time() - entry["created_at"] < SYNTHESIS_CACHE_TTL_SECONDS:
+                print("CIO Agent: Synthesis cache hit.")
+                return entry["recommendation"]
+        except (OSError, ValueError, KeyError):
+            pass  # No usable cache entry; fall through to the LLM.
+
+        reports_block = f"""\
+---
+Report 1: Fundamental Analysis
+---
+{fundamental_report}
+
+---
+Report 2: Technical Analysis
+---
+{technical_report}
+
+---
+Report 3: Macroeconomic Outlook
+---
+{macroeconomic_report}
+"""
+
         try:
-            response = self.client.chat.completions.create(
+            # Stream the completion and accumulate the deltas: tokens start
+            # flowing after the prefill instead of after the full 600-token
+            # generation, so failures surface sooner and a future UI can tap
+            # the stream. The PDF still needs the complete text either way.
+            response = await self.client.chat.completions.create(
                 model=OPENAI_CHAT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": SYNTHESIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": reports_block}
+                ],
                 temperature=0.6,
-                max_tokens=600
+                max_tokens=600,
+                stream=True
             )
-            return response.choices[0].message.content
+            recommendation_parts = []
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    recommendation_parts.append(chunk.choices[0].delta.content)
+            recommendation = "".join(recommendation_parts)
+            try:
+                with open(cache_path, "w", encoding="utf-8") as f:
+                    json.dump({"created_at": time.time(), "recommendation": recommendation}, f)
+            except OSError as e:
+                print(f"CIO Agent: Could not write synthesis cache - {e}")
+            return recommendation
         except Exception as e:
             print(f"CIO Agent: Error during final synthesis - {e}")
             return "Failed to synthesize final report due to an error."
@@ -103,7 +173,10 @@ class CIOAgent:
         Returns the file path of the generated PDF.
         """
         print(f"CIO Agent: Assembling PDF report for {ticker}...")
-        
+
+        # One clock read reused for both the title page and the filename.
+        now = datetime.datetime.now()
+
         pdf = PDF()
         pdf.add_page()
         
@@ -121,7 +194,7 @@ class CIOAgent:
         pdf.cell(0, 15, f"Investment Analysis Report", 0, 1, 'C')
         pdf.set_font("Arial", 'B', 20)
         pdf.cell(0, 10, f"Ticker: {ticker}", 0, 1, 'C')
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
         pdf.set_font("Arial", size=12)
         pdf.cell(0, 10, f"Generated on: {timestamp}", 0, 1, 'C')
         pdf.ln(10)
@@ -158,7 +231,7 @@ class CIOAgent:
         add_section("Final Recommendation", final_recommendation)
 
         # --- 6. Save PDF and return path ---
-        pdf_filename = f"Investment_Report_{ticker}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        pdf_filename = f"Investment_Report_{ticker}_{now.strftime('%Y%m%d_%H%M%S')}.pdf"
         pdf_filepath = os.path.join(self.report_output_dir, pdf_filename)
         
         pdf.output(pdf_filepath)
@@ -167,39 +240,75 @@ class CIOAgent:
         return pdf_filepath
 
 
-    def generate_investment_report(self, ticker: str):
+    async def generate_investment_report(self, ticker: str, progress_callback=None, force: bool = False):
         """
         Orchestrates the analysis and generates the final PDF report.
         Returns the file path to the generated PDF.
+
+        A PDF already generated today for the same ticker is returned
+        as-is, short-circuiting the entire pipeline (scrape, three
+        analyses, synthesis, PDF assembly). Pass force=True to regenerate
+        regardless.
+
+        progress_callback, if given, is called with a phase name as each
+        stage begins ("specialists", "macro", "synthesis", "pdf") so
+        callers like the background-job endpoint can report where the
+        pipeline is instead of a silent multi-second wait.
         """
         print(f"\n--- CIO Agent: Generating Investment Report for {ticker} ---")
 
-        # 1. Fundamental Analysis
-        fundamental_report = self.fundamental_analyst.analyze(ticker)
+        # Full-report cache: the PDF filenames embed the generation date,
+        # so a same-day re-query is a glob plus a file return.
+        if not force:
+            today_tag = datetime.datetime.now().strftime('%Y%m%d')
+            existing = sorted(glob.glob(os.path.join(
+                self.report_output_dir, f"Investment_Report_{ticker}_{today_tag}_*.pdf")))
+            if existing:
+                print(f"CIO Agent: Reusing today's report for {ticker}: {existing[-1]}")
+                return existing[-1]
 
-        # 2. Technical Analysis
-        # --- CHANGE ---
-        # Now captures two return values: the text report and the chart file path
-        technical_report, chart_path = self.technical_analyst.analyze(ticker)
+        def _progress(phase):
+            if progress_callback is not None:
+                try:
+                    progress_callback(phase)
+                except Exception as e:
+                    print(f"CIO Agent: progress callback failed - {e}")
+
+        _progress("specialists")
+
+        # 1 + 2. Fundamental and Technical Analysis
+        # Both agents are independent, so fan them out with asyncio.gather and
+        # overlap their network round-trips (LLM + yfinance) into one wait.
+        fundamental_report, (technical_report, chart_path) = await asyncio.gather(
+            self.fundamental_analyst.analyze(ticker),
+            self.technical_analyst.analyze(ticker)
+        )
 
-        # 3. Macroeconomic Analysis (using info from fundamental report as context)
+        # 3. Macroeconomic Analysis (using info from fundamental report as context,
+        # so it has to run after the fundamental analysis completes)
         try:
             company_info_context = fundamental_report.split('**Financial Health Summary**')[0]
         except:
             company_info_context = fundamental_report # fallback
 
-        macroeconomic_report = self.macroeconomic_agent.analyze(ticker, company_info_context)
-        
+        _progress("macro")
+        macroeconomic_report = await self.macroeconomic_agent.analyze(ticker, company_info_context)
+
+        _progress("synthesis")
         # 4. Synthesize Final Recommendation (Text)
-        final_recommendation = self._synthesize_report(
-            fundamental_report, 
-            technical_report, 
+        final_recommendation = await self._synthesize_report(
+            fundamental_report,
+            technical_report,
             macroeconomic_report
         )
 
+        _progress("pdf")
         # 5. --- NEW: Create the PDF ---
-        # This replaces the old .txt file saving logic
-        pdf_filepath = self._create_pdf_report(
+        # This replaces the old .txt file saving logic.
+        # FPDF's text layout is pure-Python character iteration -- CPU-bound
+        # for multi-KB reports -- so keep it off the event loop.
+        pdf_filepath = await asyncio.to_thread(
+            self._create_pdf_report,
             ticker,
             fundamental_report,
             technical_report,
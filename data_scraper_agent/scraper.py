@@ -1,7 +1,80 @@
+import json
+import os
+import tempfile
+import time
 import yfinance as yf
-from utils import get_openai_embedding
+from utils import get_openai_embeddings, get_yf_session
 from vector_db.faiss_manager import FAISSManager
 
+# TTLs for cached Yahoo lookups. Company info is near-static; headlines
+# churn faster but not per-request.
+INFO_CACHE_TTL_SECONDS = 15 * 60
+NEWS_CACHE_TTL_SECONDS = 5 * 60
+
+# Disk tier for the Yahoo caches (.cache/yf/{TICKER}/info.json etc.) so a
+# process restart within the TTL costs a file read, not an HTTP fetch.
+YF_CACHE_DIR = os.path.join(".cache", "yf")
+
+# Module-level caches shared by every DataScraperAgent instance (the API
+# constructs a fresh agent per ingest request).
+_ticker_cache = {}   # ticker -> yf.Ticker
+_info_cache = {}     # ticker -> (info dict, fetched_at)
+_news_cache = {}     # ticker -> (news list, fetched_at)
+
+def _yf_ticker(ticker: str):
+    """Returns a memoized yf.Ticker bound to the shared curl_cffi session."""
+    if ticker not in _ticker_cache:
+        _ticker_cache[ticker] = yf.Ticker(ticker, session=get_yf_session())
+    return _ticker_cache[ticker]
+
+def _read_disk_cache(ticker: str, name: str, ttl: float):
+    """Returns the cached JSON payload if its mtime is within the TTL, else None."""
+    path = os.path.join(YF_CACHE_DIR, ticker, name)
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _write_disk_cache(ticker: str, name: str, value):
+    """Atomically writes a cache payload (tempfile + os.replace, multi-process safe)."""
+    cache_dir = os.path.join(YF_CACHE_DIR, ticker)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, os.path.join(cache_dir, name))
+    except (OSError, TypeError) as e:
+        # Cache writes are best-effort; the fetch already succeeded.
+        print(f"DataScraperAgent: could not write {name} cache for {ticker} - {e}")
+
+def _cached_info(ticker: str):
+    """stock.info behind memory + disk TTL caches -- a miss is a full HTTP round-trip."""
+    entry = _info_cache.get(ticker)
+    if entry is not None and time.time() - entry[1] < INFO_CACHE_TTL_SECONDS:
+        return entry[0]
+    info = _read_disk_cache(ticker, "info.json", INFO_CACHE_TTL_SECONDS)
+    if info is None:
+        info = _yf_ticker(ticker).info
+        _write_disk_cache(ticker, "info.json", info)
+    _info_cache[ticker] = (info, time.time())
+    return info
+
+def _cached_news(ticker: str):
+    """stock.news behind memory + disk TTL caches -- same deal, shorter window."""
+    entry = _news_cache.get(ticker)
+    if entry is not None and time.time() - entry[1] < NEWS_CACHE_TTL_SECONDS:
+        return entry[0]
+    news = _read_disk_cache(ticker, "news.json", NEWS_CACHE_TTL_SECONDS)
+    if news is None:
+        news = _yf_ticker(ticker).news
+        _write_disk_cache(ticker, "news.json", news)
+    _news_cache[ticker] = (news, time.time())
+    return news
+
 class DataScraperAgent:
     """
     Agent to gather, process, and embed data from yfinance
@@ -11,44 +84,61 @@ class DataScraperAgent:
     def __init__(self, faiss_manager: FAISSManager):
         self.faiss_manager = faiss_manager
 
-    def scrape_and_process(self, ticker: str):
+    def _collect_documents(self, ticker: str):
         """
-        Scrapes financial data for a given ticker, processes it,
-        generates embeddings, and stores them in the ticker-specific index.
-        
-        RAISES:
-            Exception: If data cannot be retrieved or embeddings cannot be generated.
+        Scrapes and formats the documents (company info + top 5 headlines)
+        for one ticker. Raises if yfinance returns no usable company info.
         """
-        ticker = ticker.upper() # Ensure ticker is uppercase for consistency
         print(f"Scraping data for {ticker}...")
-        stock = yf.Ticker(ticker)
 
-        # 1. Get company info
-        info = stock.info
-        
+        # 1. Get company info (TTL-cached; repeated ingests of the same
+        # ticker skip the Yahoo round-trips entirely)
+        info = _cached_info(ticker)
+
         # --- FIX 1: ADD VALIDATION CHECK ---
         # Check if yfinance returned valid data. If not info or no longName, it's a bad ticker or network error.
         if not info or 'longName' not in info or info.get('longName') is None:
             error_msg = f"Failed to retrieve valid company info for {ticker}. The ticker may be invalid or the data source (yfinance) is unavailable."
             print(f"DataScraperAgent ERROR: {error_msg}")
             raise Exception(error_msg) # Fail loudly
-            
+
         # Prepend the ticker to the document for easier identification if needed.
         processed_info = f"{ticker}: Company: {info.get('longName')}, Sector: {info.get('sector')}, Industry: {info.get('industry')}, Summary: {info.get('longBusinessSummary')}"
 
         # 2. Get recent news
-        news = stock.news
-        
-        # Format news headlines
-        processed_news = [f"{ticker}: Headline: {item.get('headline', 'No Headline')}. Link: {item.get('link', 'No Link')}" for item in news[:5]] 
+        news = _cached_news(ticker)
 
-        # Combine data into documents
-        documents = [processed_info] + processed_news
-        
-        # Generate embeddings
+        # Format news headlines (constant prefix hoisted out of the loop)
+        news_prefix = f"{ticker}: Headline: "
+        processed_news = [
+            f"{news_prefix}{item.get('headline', 'No Headline')}. Link: {item.get('link', 'No Link')}"
+            for item in news[:5]
+        ]
+
+        return [processed_info] + processed_news
+
+    def scrape_and_process(self, ticker: str, sync_to_azure: bool = True):
+        """
+        Scrapes financial data for a given ticker, processes it,
+        generates embeddings, and stores them in the ticker-specific index.
+
+        Pass sync_to_azure=False to skip the blob upload; callers that can
+        overlap the upload with other work (the all-in-one job does) run
+        faiss_manager.sync_to_azure themselves.
+
+        RAISES:
+            Exception: If data cannot be retrieved or embeddings cannot be generated.
+        """
+        ticker = ticker.upper() # Ensure ticker is uppercase for consistency
+        documents = self._collect_documents(ticker)
+
+        # Generate embeddings -- one batched API call for all documents
+        # (info + 5 news) instead of one HTTP round-trip per document.
         print("Generating embeddings...")
-        embeddings = [get_openai_embedding(doc) for doc in documents]
-        
+        embeddings = get_openai_embeddings(documents)
+        if embeddings is None:
+            embeddings = [None] * len(documents)
+
         # Filter out any None embeddings
         valid_embeddings = [emb for emb in embeddings if emb is not None]
         valid_documents = [doc for doc, emb in zip(documents, embeddings) if emb is not None]
@@ -64,4 +154,45 @@ class DataScraperAgent:
         print(f"Data for {ticker} scraped, processed, and stored in FAISS index.")
         
         # Sync with Azure
-        self.faiss_manager.sync_to_azure(ticker)
\ No newline at end of file
+        if sync_to_azure:
+            self.faiss_manager.sync_to_azure(ticker)
+
+    def scrape_and_process_many(self, tickers: list):
+        """
+        Bulk-ingests a watchlist: scrapes every ticker, embeds ALL
+        documents across ALL tickers in a single batched embeddings call,
+        then updates and syncs each ticker's index. For N tickers this is
+        one embeddings round-trip instead of N.
+
+        Tickers whose scrape fails are skipped with a warning instead of
+        aborting the whole run. Returns the list of tickers ingested.
+        """
+        docs_by_ticker = {}
+        for ticker in tickers:
+            ticker = ticker.upper()
+            try:
+                docs_by_ticker[ticker] = self._collect_documents(ticker)
+            except Exception as e:
+                print(f"DataScraperAgent WARNING: skipping {ticker} in bulk ingest - {e}")
+
+        if not docs_by_ticker:
+            raise Exception("Bulk ingest: no tickers produced any documents.")
+
+        # One flat batched embeddings call for the whole watchlist.
+        flat_documents = [doc for docs in docs_by_ticker.values() for doc in docs]
+        print(f"Generating embeddings for {len(flat_documents)} documents across {len(docs_by_ticker)} tickers...")
+        flat_embeddings = get_openai_embeddings(flat_documents)
+        if flat_embeddings is None:
+            raise Exception("Bulk ingest: batched embedding call failed.")
+
+        # Slice the flat result back out per ticker and update each index.
+        ingested = []
+        offset = 0
+        for ticker, documents in docs_by_ticker.items():
+            embeddings = flat_embeddings[offset:offset + len(documents)]
+            offset += len(documents)
+            self.faiss_manager.add_to_index(ticker, embeddings, documents)
+            self.faiss_manager.sync_to_azure(ticker)
+            print(f"Data for {ticker} scraped, processed, and stored in FAISS index.")
+            ingested.append(ticker)
+        return ingested
\ No newline at end of file
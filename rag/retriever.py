@@ -1,4 +1,4 @@
-from utils import get_openai_embedding
+from utils import get_openai_embedding, get_openai_embeddings
 from vector_db.faiss_manager import FAISSManager
 
 class RAGRetriever:
@@ -47,5 +47,38 @@ class RAGRetriever:
 
         # 3. Format the context (No need to filter anymore!)
         context = "\n---\n".join([doc for doc, score in results])
-        
-        return context
\ No newline at end of file
+
+        return context
+
+    def retrieve_batch(self, ticker: str, queries: list, ks: list):
+        """
+        Retrieves context for multiple queries against the same ticker's index,
+        embedding all queries in ONE API call instead of one per query.
+
+        Args:
+            ticker (str): The specific ticker index to search.
+            queries (list): The search query strings.
+            ks (list): The number of documents to retrieve per query.
+
+        Returns:
+            list: One formatted context string per query, in the same
+            order. Failures -- the embedding call erroring out, or an
+            empty/absent index -- yield None (not a sentinel string) so
+            callers can tell them from real context and avoid caching them.
+        """
+        query_embeddings = get_openai_embeddings(queries)
+        if query_embeddings is None:
+            return [None] * len(queries)
+
+        # One batched FAISS call for all queries; search with the largest
+        # requested k and trim per query afterwards.
+        batch_results = self.faiss_manager.search_batch(ticker, query_embeddings, k=max(ks))
+
+        contexts = []
+        for results, k in zip(batch_results, ks):
+            results = results[:k]
+            if not results:
+                contexts.append(None)
+            else:
+                contexts.append("\n---\n".join([doc for doc, score in results]))
+        return contexts
\ No newline at end of file
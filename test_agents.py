@@ -1,5 +1,7 @@
+import glob
 import os
 import argparse
+import asyncio
 from dotenv import load_dotenv
 
 # Import the agents you want to test
@@ -21,24 +23,24 @@ def setup_environment():
     print("Environment variables loaded successfully.\n")
     return True
 
-def test_technical_agent(ticker: str):
+async def test_technical_agent(ticker: str):
     """Runs a test on the TechnicalAnalystAgent."""
     print(f"--- 2a. Testing TechnicalAnalystAgent for {ticker} ---")
     try:
         agent = TechnicalAnalystAgent(chart_output_dir="charts")
-        report = agent.analyze(ticker)
+        report = await agent.analyze(ticker)
         
         print("\n--- Technical Analyst Report ---")
         print(report)
         print("----------------------------------\n")
         
-        # Verify chart file creation
-        expected_chart_path = os.path.join("charts", f"{ticker}_technical_chart.png")
-        if os.path.exists(expected_chart_path):
-            print(f"✅ SUCCESS: Technical Analyst test passed. Chart created at {expected_chart_path}")
+        # Verify chart file creation (filenames are dated per trading day)
+        chart_matches = glob.glob(os.path.join("charts", f"{ticker}_technical_chart_*.png"))
+        if chart_matches:
+            print(f"✅ SUCCESS: Technical Analyst test passed. Chart created at {chart_matches[0]}")
             return True
         else:
-            print(f"❌ FAILURE: Technical Analyst test failed. Chart not found at {expected_chart_path}")
+            print(f"❌ FAILURE: Technical Analyst test failed. No chart found for {ticker} in charts/")
             return False
             
     except Exception as e:
@@ -85,12 +87,12 @@ def test_fundamental_agent(ticker: str, retriever=None):
     #     print(f"❌ FAILURE: FundamentalAnalystAgent failed. Error: {e}")
     #     return False
 
-def test_macro_agent():
+async def test_macro_agent():
     """Runs a test on the MacroeconomicAgent."""
     print(f"--- 2c. Testing MacroeconomicAgent ---")
     try:
         agent = MacroeconomicAgent()
-        report = agent.analyze()
+        report = await agent.analyze()
         
         print("\n--- Macroeconomic Report ---")
         print(report)
@@ -107,16 +109,8 @@ def test_macro_agent():
         print(f"❌ FAILURE: MacroeconomicAgent failed. Error: {e}")
         return False
 
-def main(ticker: str):
-    """
-    Main test runner.
-    Define your test pipeline here.
-    """
-    if not setup_environment():
-        return
-
-    print(f"--- 2. Starting Agent Tests for Ticker: {ticker} ---")
-    
+async def run_tests(ticker: str):
+    """Runs every test job on one shared event loop and collects results."""
     # Define all the test jobs you want to run
     # This is where you can easily add or remove agents from the test
     test_jobs = [
@@ -126,12 +120,32 @@ def main(ticker: str):
     ]
 
     results = {}
-    
+
     for job in test_jobs:
         print(f"\n--- Running Job: {job['name']} ---")
         test_passed = job["func"](*job["args"])
+        if asyncio.iscoroutine(test_passed):
+            test_passed = await test_passed
         results[job['name']] = "✅ PASSED" if test_passed else "❌ FAILED"
-    
+
+    return results
+
+def main(ticker: str):
+    """
+    Main test runner.
+    Define your test pipeline here.
+    """
+    if not setup_environment():
+        return
+
+    print(f"--- 2. Starting Agent Tests for Ticker: {ticker} ---")
+
+    # One asyncio.run for the whole suite: the agents share one async
+    # OpenAI client, whose connection pool binds to the loop it first runs
+    # on. A per-test asyncio.run closed that loop after the first test,
+    # so the next async test hit "Event loop is closed" on the warm pool.
+    results = asyncio.run(run_tests(ticker))
+
     # 4. Print final summary
     print("\n=========================")
     print("--- Test Run Summary ---")
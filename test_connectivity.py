@@ -1,7 +1,6 @@
 import os
-import openai
-import yfinance as yf
-from azure.storage.blob import BlobServiceClient
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # Load .env variables first
@@ -9,7 +8,10 @@ load_dotenv()
 
 # Import our project modules
 import config
-from utils import get_openai_embedding
+
+# NOTE: The heavy SDK imports (openai, yfinance, azure-storage, utils)
+# are deferred into the test functions that need them, so a config-only
+# check starts instantly and one broken SDK doesn't stop the others.
 
 def check_config():
     """1. Test if all .env variables are loaded."""
@@ -30,12 +32,25 @@ def check_config():
     print("✅ SUCCESS: All key environment variables are loaded.")
     return True
 
+# Short-lived cache for the (large) MSFT info payload so repeated smoke
+# checks within a few minutes don't re-download it.
+INFO_CACHE_TTL_SECONDS = 5 * 60
+_info_cache = None  # (info, fetched_at)
+
 def test_yfinance():
     """2. Test connection to yfinance API."""
     print("\n--- 2. Testing yfinance API ---")
+    global _info_cache
     try:
-        ticker = yf.Ticker("MSFT")
-        info = ticker.info
+        import yfinance as yf
+        from utils import get_yf_session
+        if _info_cache is not None and time.time() - _info_cache[1] < INFO_CACHE_TTL_SECONDS:
+            info = _info_cache[0]
+        else:
+            # Reuse the project's shared curl_cffi session -- same warm
+            # connection (and bot-blocking workaround) the agents use.
+            info = yf.Ticker("MSFT", session=get_yf_session()).info
+            _info_cache = (info, time.time())
         if 'longName' in info and info['longName'] == "Microsoft Corporation":
             print("✅ SUCCESS: yfinance API connection is working.")
             return True
@@ -50,8 +65,11 @@ def test_openai_embedding():
     """3. Test Azure OpenAI for Embeddings."""
     print("\n--- 3. Testing Azure OpenAI (Embeddings) ---")
     try:
+        from utils import get_openai_embedding
         embedding = get_openai_embedding("This is a connectivity test")
-        if embedding and len(embedding) > 0:
+        # Explicit None check: the helper returns a NumPy array, whose
+        # truthiness is ambiguous.
+        if embedding is not None and len(embedding) > 0:
             print(f"✅ SUCCESS: Azure OpenAI (Embeddings) is working. (Got vector of dim {len(embedding)})")
             return True
         else:
@@ -67,6 +85,7 @@ def test_openai_chat():
     """4. Test Azure OpenAI for Chat Completions."""
     print("\n--- 4. Testing Azure OpenAI (Chat) ---")
     try:
+        import openai
         client = openai.AzureOpenAI(
             azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
             api_key=config.AZURE_OPENAI_API_KEY,
@@ -94,6 +113,7 @@ def test_azure_blob():
     """5. Test Azure Blob Storage connection."""
     print("\n--- 5. Testing Azure Blob Storage ---")
     try:
+        from azure.storage.blob import BlobServiceClient
         blob_service_client = BlobServiceClient.from_connection_string(config.AZURE_STORAGE_CONNECTION_STRING)
         container_client = blob_service_client.get_container_client(config.AZURE_STORAGE_CONTAINER_NAME)
         
@@ -115,15 +135,22 @@ def main():
     print("--- Starting Connectivity Test ---")
     print("=====================================")
     
-    # Run all tests and track results
-    results = [
-        check_config(),
-        test_yfinance(),
-        test_openai_embedding(),
-        test_openai_chat(),
-        test_azure_blob()
-    ]
-    
+    # Config check first -- it gates everything else.
+    results = [check_config()]
+
+    # The four network checks are independent and each waits seconds on
+    # I/O, so run them concurrently: total wall time is the slowest check
+    # instead of the sum of all four. (Their progress prints may interleave.)
+    network_tests = [test_yfinance, test_openai_embedding, test_openai_chat, test_azure_blob]
+    with ThreadPoolExecutor(max_workers=len(network_tests)) as pool:
+        futures = {pool.submit(test): test.__name__ for test in network_tests}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result(timeout=60))
+            except Exception as e:
+                print(f"❌ FAILURE: {futures[future]} raised an unexpected error: {e}")
+                results.append(False)
+
     print("\n=====================================")
     print("--- Test Summary ---")
     print("=====================================")
@@ -1,16 +1,206 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+import httpx
+import numpy as np
 import openai
-from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_EMBEDDING_MODEL
+from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, OPENAI_API_VERSION, OPENAI_EMBEDDING_MODEL, FAISS_INDEX_PATH
+
+# Transient-failure retries for embedding calls (exponential backoff + jitter).
+EMBEDDING_RETRY_ATTEMPTS = 3
+
+# Azure's ada-002 deployment accepts at most 16 inputs per embeddings request.
+EMBEDDING_BATCH_SIZE = 16
+
+# Two-tier embedding cache: a bounded in-process dict in front of a SQLite
+# store on disk. Identical texts (fixed query templates, boilerplate
+# disclosures, re-scraped headlines) never hit the network twice, even
+# across process restarts. Vectors are stored as float32 bytes.
+EMBED_MEMORY_CACHE_MAX = 10000
+_embed_memory_cache = {}
+_embed_db = None
+_embed_db_lock = threading.Lock()
+
+def _get_embed_db():
+    """Lazily opens the on-disk embedding cache (shared across threads)."""
+    global _embed_db
+    if _embed_db is None:
+        os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+        _embed_db = sqlite3.connect(
+            os.path.join(FAISS_INDEX_PATH, "embed_cache.db"), check_same_thread=False
+        )
+        _embed_db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB)")
+        _embed_db.commit()
+    return _embed_db
+
+def _embed_cache_key(text: str) -> bytes:
+    # The model name is part of the key so vectors from different
+    # deployments can never collide.
+    return hashlib.sha256(f"{OPENAI_EMBEDDING_MODEL}\0{text}".encode("utf-8")).digest()
+
+def _embed_cache_get(key: bytes):
+    """Looks a vector up in memory, then on disk. Returns None on miss."""
+    vec = _embed_memory_cache.get(key)
+    if vec is not None:
+        return vec
+    try:
+        with _embed_db_lock:
+            row = _get_embed_db().execute(
+                "SELECT vec FROM embeddings WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Embedding cache read failed: {e}")
+        return None
+    if row is None:
+        return None
+    vec = np.frombuffer(row[0], dtype=np.float32)
+    _embed_cache_remember(key, vec)
+    return vec
+
+def _embed_cache_remember(key: bytes, vec):
+    """Puts a vector in the memory tier, evicting oldest-first when full."""
+    if len(_embed_memory_cache) >= EMBED_MEMORY_CACHE_MAX:
+        _embed_memory_cache.pop(next(iter(_embed_memory_cache)))
+    _embed_memory_cache[key] = vec
+
+def _embed_cache_put(key: bytes, vec):
+    """Persists a freshly fetched vector to both cache tiers."""
+    _embed_cache_remember(key, vec)
+    try:
+        with _embed_db_lock:
+            db = _get_embed_db()
+            db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+                (key, vec.tobytes()))
+            db.commit()
+    except sqlite3.Error as e:
+        print(f"Embedding cache write failed: {e}")
+
+# Process-wide async client shared by all agents (created lazily).
+_shared_async_client = None
+
+# Process-wide sync client for the embedding helpers (created lazily).
+_shared_sync_client = None
+
+# Process-wide HTTP session for yfinance (created lazily).
+_yf_session = None
+
+def get_yf_session():
+    """
+    Returns a shared curl_cffi session for all yfinance calls.
+
+    yfinance defaults to a fresh requests session per Ticker, paying a new
+    TCP+TLS handshake to Yahoo each time. One shared session reuses the
+    connection across the macro batch, technical history, and news calls;
+    curl_cffi's browser impersonation also avoids Yahoo bot-blocking.
+    """
+    global _yf_session
+    if _yf_session is None:
+        from curl_cffi import requests as curl_requests
+        _yf_session = curl_requests.Session(impersonate="chrome")
+    return _yf_session
+
+def get_shared_async_client():
+    """
+    Returns a single AsyncAzureOpenAI client shared across all agents.
+
+    Each agent used to construct its own client, each with its own httpx
+    pool, so every agent paid its own TCP+TLS handshake. One client with a
+    tuned connection pool reuses warm connections across the whole pipeline.
+
+    The underlying httpx pool binds to the event loop it first runs on, so
+    all async work in a process must share a single loop (one asyncio.run
+    / one uvicorn loop); reusing the client across separate loops fails
+    with "Event loop is closed".
+    """
+    global _shared_async_client
+    if _shared_async_client is None:
+        _shared_async_client = openai.AsyncAzureOpenAI(
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version=OPENAI_API_VERSION,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            ),
+            # Retry transient 429/5xx/timeouts inside the SDK; the pool's
+            # max_connections doubles as the concurrency cap once the
+            # agents fan out in parallel.
+            max_retries=3,
+        )
+    return _shared_async_client
+
+def _create_embeddings_with_retry(client, texts: list):
+    """
+    Calls embeddings.create, retrying rate-limit/timeout/connection
+    failures with exponential backoff + jitter. Other errors raise
+    immediately; the callers' existing except blocks handle them.
+    """
+    for attempt in range(EMBEDDING_RETRY_ATTEMPTS):
+        try:
+            return client.embeddings.create(input=texts, model=OPENAI_EMBEDDING_MODEL)
+        except (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError) as e:
+            if attempt == EMBEDDING_RETRY_ATTEMPTS - 1:
+                raise
+            delay = 0.5 * (2 ** attempt) + random.uniform(0, 0.25)
+            print(f"Embedding call failed ({type(e).__name__}); retrying in {delay:.2f}s...")
+            time.sleep(delay)
+
+def _get_shared_sync_client():
+    """
+    Returns a single sync AzureOpenAI client for the embedding helpers.
+
+    These used to build a fresh client -- new httpx pool, new TLS context
+    -- on every call; one shared client keeps the connection warm across
+    consecutive embedding batches.
+    """
+    global _shared_sync_client
+    if _shared_sync_client is None:
+        _shared_sync_client = openai.AzureOpenAI(
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version=OPENAI_API_VERSION,
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+            ),
+        )
+    return _shared_sync_client
 
 def get_openai_embedding(text: str):
-    """Generates an embedding for a given text using Azure OpenAI."""
-    client = openai.AzureOpenAI(
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-        api_key=AZURE_OPENAI_API_KEY,
-        api_version=OPENAI_API_VERSION,
-    )
+    """Generates an embedding (1D float32 array) for a given text using Azure OpenAI."""
+    embeddings = get_openai_embeddings([text])
+    return embeddings[0] if embeddings is not None else None
+
+def get_openai_embeddings(texts: list):
+    """
+    Generates embeddings for multiple texts in batched API calls.
+    Cached texts are served from the two-tier embedding cache; only the
+    misses go to the API, chunked to the deployment's per-request limit.
+
+    Returns a contiguous (n, d) float32 ndarray in input order (None on
+    failure), so FAISS add/search paths consume it without re-converting
+    a list of Python floats element by element.
+    """
+    keys = [_embed_cache_key(text) for text in texts]
+    results = [_embed_cache_get(key) for key in keys]
+    miss_indices = [i for i, vec in enumerate(results) if vec is None]
+    if not miss_indices:
+        return np.vstack(results)
+
+    client = _get_shared_sync_client()
     try:
-        response = client.embeddings.create(input=[text], model=OPENAI_EMBEDDING_MODEL)
-        return response.data[0].embedding
+        miss_texts = [texts[i] for i in miss_indices]
+        fetched = []
+        for start in range(0, len(miss_texts), EMBEDDING_BATCH_SIZE):
+            response = _create_embeddings_with_retry(client, miss_texts[start:start + EMBEDDING_BATCH_SIZE])
+            # The API may return items out of order; sort by index to be safe.
+            fetched.extend(np.asarray(item.embedding, dtype=np.float32)
+                           for item in sorted(response.data, key=lambda d: d.index))
+        for i, vec in zip(miss_indices, fetched):
+            _embed_cache_put(keys[i], vec)
+            results[i] = vec
+        return np.vstack(results)
     except Exception as e:
-        print(f"Error getting embedding: {e}")
+        print(f"Error getting embeddings: {e}")
         return None
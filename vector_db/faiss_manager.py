@@ -1,10 +1,45 @@
 import os
 import faiss
 import numpy as np
+import orjson
 import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient
 from config import AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME, FAISS_INDEX_PATH, INDEX_FILE_NAME, INDEX_MAPPING_FILE_NAME
 
+# Below this corpus size, a brute-force scan over an fp16 scalar-quantized
+# inner-product index is faster than an approximate index (no graph build,
+# no measurable recall loss); past it, HNSW wins on search latency.
+HNSW_MIN_VECTORS = 5000
+
+# How many tickers' indexes to keep resident at once (LRU-evicted).
+INDEX_CACHE_MAX_TICKERS = 8
+
+def _effective_cpu_count():
+    """
+    CPUs actually available to this process: the cgroup v2 quota when one
+    is set (containers), else the scheduler affinity mask, else the raw
+    hardware count.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# FAISS's OpenMP pool defaults to the hardware thread count, which
+# oversubscribes (and context-switch thrashes) when a container quota
+# caps us below that. Pin it once at import.
+faiss.omp_set_num_threads(_effective_cpu_count())
+
 class FAISSManager:
     """
     Manages FAISS indices and their synchronization with Azure Blob Storage.
@@ -17,7 +52,41 @@ class FAISSManager:
         # Only create the base directory; index files are managed dynamically.
         os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
         self.index = None
-        self.doc_mapping = {}
+        # Documents stored positionally: FAISS returns integer row ids,
+        # which are exactly list indices -- no dict needed.
+        self.docs = []
+        # Resident indexes keyed by ticker (LRU, bounded), so repeated
+        # load_index calls -- including interleaved tickers -- skip the
+        # disk deserialize entirely.
+        self._index_cache = OrderedDict()
+        # Guards every reader and writer of index/docs/_index_cache: the
+        # API handlers, the background job and the warm-up thread all call
+        # into this manager concurrently. Reentrant because the locked
+        # compound operations (add_to_index, _resident_index) call the
+        # locked primitives (load_index, save_index).
+        self._lock = threading.RLock()
+        # Container client reused across all Azure syncs (created lazily).
+        self._container_client = None
+
+    def _cache_index(self, ticker_key: str):
+        """Records the current index/docs under the ticker, evicting LRU."""
+        self._index_cache[ticker_key] = (self.index, self.docs)
+        self._index_cache.move_to_end(ticker_key)
+        while len(self._index_cache) > INDEX_CACHE_MAX_TICKERS:
+            self._index_cache.popitem(last=False)
+
+    def _get_container_client(self):
+        """
+        Returns a shared container client for Azure Blob Storage.
+
+        Each sync call used to build a fresh BlobServiceClient, paying a
+        new TLS handshake per ticker sync and defeating connection
+        pooling; one client reuses its pool for every upload/download.
+        """
+        if self._container_client is None:
+            blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+            self._container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+        return self._container_client
 
     def _get_paths(self, ticker: str):
         """Generates the local and Azure-friendly paths for a specific ticker."""
@@ -34,106 +103,228 @@ class FAISSManager:
 
     def load_index(self, ticker: str):
         """Loads the FAISS index and mapping for a specific ticker from local files."""
-        local_index_path, local_mapping_path, _, _ = self._get_paths(ticker)
-        
-        if os.path.exists(local_index_path) and os.path.exists(local_mapping_path):
-            self.index = faiss.read_index(local_index_path)
-            with open(local_mapping_path, 'rb') as f:
-                self.doc_mapping = pickle.load(f)
-            print(f"FAISS index for {ticker} loaded from local files.")
-            return True
-        
-        self.index = None
-        self.doc_mapping = {}
-        return False
+        # Serve from the resident-index cache when possible (e.g.,
+        # /generate-and-analyze just built it, or the same tickers are
+        # queried back and forth). Saves a full deserialize from disk.
+        with self._lock:
+            ticker_key = ticker.upper()
+            cached = self._index_cache.get(ticker_key)
+            if cached is not None:
+                self.index, self.docs = cached
+                self._index_cache.move_to_end(ticker_key)
+                return True
+
+            local_index_path, local_mapping_path, _, _ = self._get_paths(ticker)
+
+            if os.path.exists(local_index_path) and os.path.exists(local_mapping_path):
+                self.index = faiss.read_index(local_index_path)
+                with open(local_mapping_path, 'rb') as f:
+                    raw = f.read()
+                try:
+                    docs = orjson.loads(raw)
+                except orjson.JSONDecodeError:
+                    # Mapping files from before the JSON migration are pickles,
+                    # possibly holding the even older {int: doc} dict shape.
+                    docs = pickle.loads(raw)
+                    if isinstance(docs, dict):
+                        docs = [docs[i] for i in sorted(docs)]
+                self.docs = docs
+                self._cache_index(ticker_key)
+                print(f"FAISS index for {ticker} loaded from local files.")
+                return True
+
+            self.index = None
+            self.docs = []
+            return False
 
     def save_index(self, ticker: str):
         """Saves the current FAISS index and mapping to ticker-specific local files."""
-        local_index_path, local_mapping_path, _, _ = self._get_paths(ticker)
-        
-        if self.index:
-            faiss.write_index(self.index, local_index_path)
-            with open(local_mapping_path, 'wb') as f:
-                pickle.dump(self.doc_mapping, f)
-            print(f"FAISS index for {ticker} saved locally.")
+        with self._lock:
+            local_index_path, local_mapping_path, _, _ = self._get_paths(ticker)
+
+            if self.index:
+                faiss.write_index(self.index, local_index_path)
+                with open(local_mapping_path, 'wb') as f:
+                    f.write(orjson.dumps(self.docs))
+                # The in-memory index now matches what is on disk for this ticker.
+                self._cache_index(ticker.upper())
+                print(f"FAISS index for {ticker} saved locally.")
 
     def create_index(self, embeddings, documents):
-        """Creates a new FAISS index based on the provided data."""
-        if not embeddings:
+        """
+        Creates a new FAISS index based on the provided data.
+
+        Small corpora get a brute-force fp16 IndexScalarQuantizer over
+        inner product (exhaustive scan is fastest at this size, and fp16
+        halves the storage); past HNSW_MIN_VECTORS the index is built as
+        HNSW for sub-linear search. Both serialize through
+        faiss.write_index/read_index, so save/load need no special-casing.
+        """
+        # len() guard rather than truthiness: embeddings may arrive as an
+        # (n, d) ndarray from the batched embedding helper.
+        if embeddings is None or len(embeddings) == 0:
             print("No embeddings provided to create index.")
             return
 
         dimension = len(embeddings[0])
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(np.array(embeddings, dtype=np.float32))
-        self.doc_mapping = {i: doc for i, doc in enumerate(documents)}
+        if len(embeddings) < HNSW_MIN_VECTORS:
+            # fp16 storage halves the index file (and every blob sync)
+            # versus flat float32; QT_fp16 needs no training pass and its
+            # recall loss on unit-norm embeddings is negligible.
+            self.index = faiss.IndexScalarQuantizer(
+                dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        else:
+            self.index = faiss.IndexHNSWFlat(dimension, 32, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = 200
+            self.index.hnsw.efSearch = 64
+        # L2-normalized vectors make inner product equal cosine similarity,
+        # giving the same ranking as L2 distance through FAISS's single
+        # fused dot-product kernel instead of dot products plus norms.
+        arr = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(arr)
+        self.index.add(arr)
+        self.docs = list(documents)
 
     def add_to_index(self, ticker: str, new_embeddings, new_documents):
         """Adds new embeddings and documents to an existing index for the given ticker."""
-        
-        # 1. Ensure the correct index is loaded (or create a new one)
-        self.load_index(ticker)
-        
-        if self.index is None:
-            self.create_index(new_embeddings, new_documents)
-        else:
-            # 2. Add new data
-            self.index.add(np.array(new_embeddings, dtype=np.float32))
-            
-            # Update mapping
-            start_index = len(self.doc_mapping)
-            for i, doc in enumerate(new_documents):
-                self.doc_mapping[start_index + i] = doc
-                
-        # 3. Save the updated index locally
-        self.save_index(ticker)
+        # Held across the whole load-modify-save so a concurrent load of
+        # another ticker cannot swap index/docs out mid-update.
+        with self._lock:
+            # 1. Ensure the correct index is loaded (or create a new one)
+            self.load_index(ticker)
+
+            if self.index is None:
+                self.create_index(new_embeddings, new_documents)
+            else:
+                # 2. Add new data (normalized to match inner-product indexes;
+                # indexes loaded from before the IP migration stay on raw L2)
+                arr = np.array(new_embeddings, dtype=np.float32)
+                if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                    faiss.normalize_L2(arr)
+                self.index.add(arr)
+
+                # New rows land at the end of the index, so the document list
+                # just extends in step.
+                self.docs.extend(new_documents)
+
+            # 3. Save the updated index locally
+            self.save_index(ticker)
+
+    def _resident_index(self, ticker: str):
+        """
+        Loads (if needed) and returns the (index, docs) pair for a ticker.
+
+        The search paths run concurrently on worker threads (to_thread
+        request handlers, the background job, warm-up), and self.index /
+        self.docs are shared mutable state: another thread's load_index
+        for a different ticker between our load and our search would swap
+        the docs out from under us. Take the pair under the lock and let
+        the caller search its own local references.
+
+        Returns (None, []) when no index exists for the ticker.
+        """
+        with self._lock:
+            if not self.load_index(ticker):
+                return None, []
+            return self.index, self.docs
 
     def search(self, ticker: str, query_embedding, k=5):
         """Searches the index for a specific ticker for the top k similar documents."""
-        
-        # Ensure the correct index is loaded before searching
-        if not self.load_index(ticker):
-             # The index should have been loaded before the search is called,
-             # but we check again for robustness.
-             return []
-             
-        if self.index is None:
+
+        index, docs = self._resident_index(ticker)
+        if index is None:
             return []
-            
-        distances, indices = self.index.search(np.array([query_embedding], dtype=np.float32), k)
-        return [(self.doc_mapping[i], distances[0][j]) for j, i in enumerate(indices[0])]
+
+        xq = np.array([query_embedding], dtype=np.float32)
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(xq)
+        distances, indices = index.search(xq, k)
+        # FAISS pads with -1 when the index holds fewer than k vectors;
+        # unfiltered, those would wrap around the docs list.
+        return [(docs[i], distances[0][j])
+                for j, i in enumerate(indices[0]) if i >= 0]
+
+    def search_batch(self, ticker: str, query_embeddings, k=5):
+        """
+        Searches the index for several queries with one FAISS call.
+
+        FAISS blocks the distance computation across the whole (nq x d)
+        query matrix in C++, so one batched call is far cheaper than nq
+        single-query calls crossing the Python/C boundary each time.
+
+        Returns one list of (doc, distance) tuples per query, in order.
+        """
+        n_queries = len(query_embeddings)
+        index, docs = self._resident_index(ticker)
+        if index is None:
+            return [[] for _ in range(n_queries)]
+
+        xq = np.array(query_embeddings, dtype=np.float32)
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(xq)
+        distances, indices = index.search(xq, k)
+        # Same -1 sentinel masking as search().
+        return [
+            [(docs[i], distances[q][j]) for j, i in enumerate(indices[q]) if i >= 0]
+            for q in range(n_queries)
+        ]
 
     def sync_to_azure(self, ticker: str):
         """Uploads the local index files for a specific ticker to Azure Blob Storage."""
         local_index_path, local_mapping_path, index_file, mapping_file = self._get_paths(ticker)
+        container_client = self._get_container_client()
 
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-        
-        for local_path, azure_name in [(local_index_path, index_file), (local_mapping_path, mapping_file)]:
-            if os.path.exists(local_path):
-                with open(local_path, "rb") as data:
-                    container_client.upload_blob(name=azure_name, data=data, overwrite=True)
-                print(f"Uploaded {azure_name} to Azure Blob Storage.")
+        def _upload(pair):
+            local_path, azure_name = pair
+            with open(local_path, "rb") as data:
+                # Passing the length lets the SDK stream the file in
+                # parallel blocks instead of buffering it whole.
+                container_client.upload_blob(
+                    name=azure_name, data=data, overwrite=True,
+                    length=os.path.getsize(local_path), max_concurrency=8)
+            print(f"Uploaded {azure_name} to Azure Blob Storage.")
+
+        # The index and mapping uploads are independent network writes;
+        # run them concurrently instead of back-to-back.
+        pairs = [(local_path, azure_name)
+                 for local_path, azure_name in [(local_index_path, index_file), (local_mapping_path, mapping_file)]
+                 if os.path.exists(local_path)]
+        if pairs:
+            with ThreadPoolExecutor(max_workers=len(pairs)) as pool:
+                list(pool.map(_upload, pairs))
 
     def sync_from_azure(self, ticker: str):
         """Downloads the index files for a specific ticker from Azure Blob Storage."""
         local_index_path, local_mapping_path, index_file, mapping_file = self._get_paths(ticker)
+        container_client = self._get_container_client()
+
+        def _download(pair):
+            local_path, azure_name = pair
+            try:
+                with open(local_path, "wb") as download_file:
+                    # readinto streams chunks straight to the file handle,
+                    # keeping peak memory constant regardless of index size
+                    # (readall materialized the whole blob first).
+                    stream = container_client.download_blob(azure_name, max_concurrency=8)
+                    stream.readinto(download_file)
+                print(f"Downloaded {azure_name} from Azure Blob Storage.")
+                return True
+            except Exception as e:
+                # It's okay if a file doesn't exist on Azure for a new ticker
+                print(f"WARNING: Could not download {azure_name} from Azure (Error: {e})")
+                return False
+
+        # Both downloads are independent; fetch them concurrently.
+        pairs = [(local_index_path, index_file), (local_mapping_path, mapping_file)]
+        with ThreadPoolExecutor(max_workers=len(pairs)) as pool:
+            success = all(list(pool.map(_download, pairs)))
+
 
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-
-        success = True
-        for local_path, azure_name in [(local_index_path, index_file), (local_mapping_path, mapping_file)]:
-             try:
-                 with open(local_path, "wb") as download_file:
-                    download_file.write(container_client.download_blob(azure_name).readall())
-                 print(f"Downloaded {azure_name} from Azure Blob Storage.")
-             except Exception as e:
-                 # It's okay if a file doesn't exist on Azure for a new ticker
-                 print(f"WARNING: Could not download {azure_name} from Azure (Error: {e})")
-                 success = False
-                 
         if success:
-             self.load_index(ticker)
+             # The files on disk just changed; drop the cached entry so
+             # load_index actually reads the fresh download. One lock span
+             # so no thread sees the gap between the drop and the reload.
+             with self._lock:
+                 self._index_cache.pop(ticker.upper(), None)
+                 self.load_index(ticker)
         return success
\ No newline at end of file